@@ -42,19 +42,18 @@ researchers = [
     {"name": "Adeola Li", "work": "Quantum Phys. & Earthly Sci.", "institute": "Academy for Planetary and Quantum Inquiry", "group": "robots.txt 2nd"}
 ]
 
+# Spaces and hyphens in names become underscores in persona keys
+KEY_TABLE = str.maketrans(" -", "__")
+
 # Generate prompts for each researcher
 prompts_by_persona = {}
 
 for researcher in researchers:
-    persona_key = f"persona_{researcher['name'].lower().replace(' ', '_').replace('-', '_')}"
+    persona_key = f"persona_{researcher['name'].lower().translate(KEY_TABLE)}"
     
-    prompts = []
-    for template in templates:
-        # Fill in the template
-        prompt = template.replace("{X}", researcher['name'])
-        prompt = prompt.replace("{Y}", researcher['work'])
-        prompt = prompt.replace("{I}", researcher['institute'])
-        prompts.append(prompt)
+    # Fill in the templates ({X} = name, {Y} = work, {I} = institute)
+    view = {"X": researcher['name'], "Y": researcher['work'], "I": researcher['institute']}
+    prompts = [template.format_map(view) for template in templates]
     
     prompts_by_persona[persona_key] = prompts
 
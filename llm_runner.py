@@ -7,26 +7,131 @@ from pathlib import Path
 from typing import Optional, Dict, Any, List
 import yaml
 import re
+import time
+import hashlib
+import os
+import sqlite3
 from datetime import datetime
+from collections import defaultdict
 import json
 
-from playwright.async_api import async_playwright, Page, Frame, Locator
+from playwright.async_api import async_playwright, Playwright, Browser, BrowserContext, Page, Frame, Locator, Route
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 # =========================
 # Utils
 # =========================
 
-COMMON_ARGS = ["--disable-blink-features=AutomationControlled"]
+COMMON_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-sync",
+]
+
+# innerText of the last node matching the response selector, in one round-trip
+LAST_RESPONSE_TEXT_JS = """
+(sel) => {
+    const els = document.querySelectorAll(sel);
+    return els.length ? els[els.length - 1].innerText : "";
+}
+"""
+
+RESPONSES_DIR = Path("responses")
+CACHE_PATH = RESPONSES_DIR / ".cache.sqlite3"
+
+# Media and font files the automated runs never need; a narrow pattern keeps
+# every other request off the Python route handler and in the HTTP cache
+BLOCKED_RESOURCES = "**/*.{mp4,webm,ogg,mp3,m4a,wav,woff,woff2,ttf,otf,eot}"
+
+# True once a new response node exists and its text has been stable for `quiet` ms
+RESPONSE_SETTLED_JS = """
+({sel, before, quiet}) => {
+    const els = document.querySelectorAll(sel);
+    if (els.length <= before) {
+        window.__lastT = undefined;
+        return false;
+    }
+    const t = els[els.length - 1].innerText;
+    const now = Date.now();
+    if (!t || t !== window.__lastT) {
+        window.__lastT = t;
+        window.__lastTs = now;
+        return false;
+    }
+    return now - window.__lastTs >= quiet;
+}
+"""
+
+# \w is exactly str.isalnum() plus "_"
+_UNSAFE_NAME = re.compile(r'[^\w-]')
 
 def sanitize_name(name: str) -> str:
-    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+    return _UNSAFE_NAME.sub('_', name)
+
+# Non-ASCII also covers icons and emojis (U+10000 and up)
+_NON_ASCII = re.compile(r'[^\x00-\x7F]+')
+_WS = re.compile(r'\s+')
 
 def clean_text(text: str) -> str:
     """Remove icons, emojis, and extra whitespace."""
-    text = re.sub(r'[\U00010000-\U0010ffff]', '', text)
-    text = re.sub(r'[^\x00-\x7F]+', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    return _WS.sub(' ', _NON_ASCII.sub('', text)).strip()
+
+def run_event_loop(coro):
+    """Run `coro` on uvloop when it is installed, asyncio's default loop otherwise."""
+    # uvloop is an optional, faster drop-in loop; it does not support Windows,
+    # and uvloop.run only exists from 0.18 on
+    try:
+        import uvloop
+    except ImportError:
+        uvloop = None
+    uvloop_run = getattr(uvloop, "run", None)
+    if uvloop_run is not None and sys.platform != 'win32':
+        return uvloop_run(coro)
+    return asyncio.run(coro)
+
+class RateLimiter:
+    """Space out calls so that at most one starts every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+                now = self._next
+            self._next = now + self.interval
+
+class ResponseCache:
+    """Persistent store of cleaned responses, keyed by LLM name and prompt hash."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path))
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT)")
+
+    @staticmethod
+    def key(llm_name: str, prompt: str) -> str:
+        return f"{llm_name}:{hashlib.sha1(prompt.encode('utf-8')).hexdigest()}"
+
+    def get(self, llm_name: str, prompt: str) -> Optional[str]:
+        row = self._db.execute("SELECT response FROM responses WHERE key = ?",
+                               (self.key(llm_name, prompt),)).fetchone()
+        return row[0] if row else None
+
+    def set(self, llm_name: str, prompt: str, response: str):
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?)",
+                             (self.key(llm_name, prompt), response))
+
+    def close(self):
+        self._db.close()
 
 def frames_in_read_order(page: Page) -> List[Frame]:
     frs = [page.main_frame]
@@ -40,7 +145,27 @@ def frames_in_read_order(page: Page) -> List[Frame]:
 # =========================
 
 async def find_input(page: Page, input_selector: Optional[str]) -> Locator:
-    """Find the chat input."""
+    """Find the chat input, reusing the one found for this page earlier."""
+    cached = getattr(page, "_cached_input", None)
+    if cached is not None:
+        try:
+            if await cached.is_visible():
+                return cached
+        except Exception:
+            pass
+    
+    loc = await _probe_input(page)
+    if not hasattr(page, "_cached_input"):
+        # Drop the cached locator whenever the page navigates
+        def _reset(frame: Frame):
+            if frame is page.main_frame:
+                page._cached_input = None
+        page.on("framenavigated", _reset)
+    page._cached_input = loc
+    return loc
+
+async def _probe_input(page: Page) -> Locator:
+    """Probe every frame for a visible chat input, all candidates in parallel."""
     candidates = [
         "textarea",
         "div[contenteditable='true']",
@@ -49,21 +174,24 @@ async def find_input(page: Page, input_selector: Optional[str]) -> Locator:
         "#prompt-textarea",
     ]
     
+    # Ordered by preference: main frame first, role=textbox before CSS fallbacks
+    locators: List[Locator] = []
     for fr in frames_in_read_order(page):
-        try:
-            loc = fr.get_by_role("textbox").first
-            await loc.wait_for(state="visible", timeout=5000)
-            return loc
-        except:
-            pass
-        
-        for sel in candidates:
-            try:
-                loc = fr.locator(sel).first
-                await loc.wait_for(state="visible", timeout=1000)
-                return loc
-            except:
-                continue
+        locators.append(fr.get_by_role("textbox").first)
+        locators.extend(fr.locator(sel).first for sel in candidates)
+    
+    tasks = [asyncio.create_task(loc.wait_for(state="visible", timeout=3000))
+             for loc in locators]
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            hits = [i for i, t in enumerate(tasks) if t in done and t.exception() is None]
+            if hits:
+                return locators[min(hits)]
+    finally:
+        for t in tasks:
+            t.cancel()
     
     raise RuntimeError(" Input field not found")
 
@@ -89,6 +217,23 @@ async def launch_persistent(user_data_dir: Path, headless: bool):
     )
     return pw, context
 
+async def new_llm_context(browser: Browser, state_path: Path) -> BrowserContext:
+    """Open an isolated context in a shared browser, restoring a saved login."""
+    context = await browser.new_context(
+        storage_state=str(state_path),
+        locale="en-US",
+        user_agent=("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                    "(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"),
+        viewport={"width": 1366, "height": 900},
+        ignore_https_errors=True,
+        service_workers="block",
+    )
+    await context.route(BLOCKED_RESOURCES, block_heavy_resources)
+    return context
+
+async def block_heavy_resources(route: Route):
+    await route.abort()
+
 # =========================
 # Core flows
 # =========================
@@ -122,36 +267,65 @@ async def cmd_setup(llm: Dict[str, Any]) -> Dict[str, Any]:
         return {**llm, "profile_dir": str(profile_dir)}
     
     finally:
-        await page.wait_for_timeout(2000)
+        await asyncio.sleep(2)
         await ctx.close()
         await pw.stop()
         
 
+async def _response_settled(page: Page, response_sel: str, before: int, timeout: int) -> bool:
+    """Wait up to `timeout` ms for a new response whose text has stopped changing."""
+    try:
+        await page.wait_for_function(
+            RESPONSE_SETTLED_JS,
+            arg={"sel": response_sel, "before": before, "quiet": 1500},
+            timeout=timeout,
+            polling=250,
+        )
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
 async def send_prompt(page: Page, llm: Dict[str, Any], prompt: str) -> Optional[str]:
     """Send prompt and get response. Returns response text or None."""
     
     try:
+        response_sel = llm.get("response_selector", ".markdown")
+        before = await page.locator(response_sel).count()
+        
         inp = await find_input(page, llm.get("input_selector"))
         await inp.click()
-        await page.keyboard.type(prompt, delay=30)
-        
+        # fill() handles textarea/input and contenteditable in one round-trip
+        await inp.fill(prompt)
+
         await page.wait_for_timeout(300)
-        await page.keyboard.press("Enter")
-        await page.wait_for_timeout(100)  # WAIT between presses
-        await page.keyboard.press("Enter")
-        await page.wait_for_timeout(100)
-        await page.keyboard.press("Enter")
+        await inp.press("Enter")
         
         print("   Waiting for response...")
-        wait_time = llm.get("wait_time", 10000)
-        await page.wait_for_timeout(wait_time)
+        wait_time = llm.get("wait_time", 30000)
+        ema = llm.get("wait_ema")
+        # Adapt to the provider's observed latency, capped by wait_time
+        limit = min(wait_time, max(3000, int(2.5 * ema))) if ema else wait_time
+        started = time.monotonic()
+        settled = await _response_settled(page, response_sel, before, limit)
+        if not settled:
+            # Without a new node the last one is the previous prompt's answer
+            if await page.locator(response_sel).count() <= before:
+                print(f"   No new response after {limit} ms")
+                return None
+            if limit < wait_time:
+                # The adaptive limit is soft: a response still streaming gets the full wait_time
+                settled = await _response_settled(page, response_sel, before, wait_time - limit)
+            if not settled:
+                print(f"   Response still changing after {wait_time} ms, reading it anyway")
+        elapsed = (time.monotonic() - started) * 1000
         
-        response_sel = llm.get("response_selector", ".markdown")
-        last = page.locator(response_sel).last
-        text = (await last.inner_text()).strip()
+        text = (await page.evaluate(LAST_RESPONSE_TEXT_JS, response_sel)).strip()
         
         if text and len(text) > 1:
             cleaned = clean_text(text)
+            # Timeouts say nothing about how long a full answer takes
+            if settled:
+                llm["wait_ema"] = round(elapsed if not ema else 0.8 * ema + 0.2 * elapsed)
             print(f" Got response ({len(cleaned)} chars)")
             return cleaned
         else:
@@ -164,23 +338,17 @@ async def send_prompt(page: Page, llm: Dict[str, Any], prompt: str) -> Optional[
 
 def save_response(llm_name: str, prompt: str, response: str, honeypot_name: str = None):
     """Save response to file."""
-    output_dir = Path("responses")
-    output_dir.mkdir(exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    now = datetime.now()
     
+    output_dir = RESPONSES_DIR
     if honeypot_name:
-        honeypot_dir = output_dir / sanitize_name(honeypot_name)
-        honeypot_dir.mkdir(exist_ok=True)
-        filename = f"{sanitize_name(llm_name)}_{timestamp}.txt"
-        filepath = honeypot_dir / filename
-    else:
-        filename = f"{sanitize_name(llm_name)}_{timestamp}.txt"
-        filepath = output_dir / filename
+        output_dir = output_dir / sanitize_name(honeypot_name)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    filepath = output_dir / f"{sanitize_name(llm_name)}_{now.strftime('%Y%m%d_%H%M%S_%f')}.txt"
     
     with open(filepath, "w", encoding="utf-8") as f:
         f.write(f"Provider: {llm_name}\n")
-        f.write(f"Timestamp: {datetime.now().isoformat()}\n")
+        f.write(f"Timestamp: {now.isoformat()}\n")
         if honeypot_name:
             f.write(f"Honeypot: {honeypot_name}\n")
         f.write(f"Prompt: {prompt}\n")
@@ -189,7 +357,18 @@ def save_response(llm_name: str, prompt: str, response: str, honeypot_name: str
     
     print(f"   Saved to: {filepath}")
 
-async def cmd_test(llm: Dict[str, Any], prompt: str, save: bool = True, honeypot_name: str = None) -> bool:
+def save_responses(filepath: Path, records: List[Dict[str, Any]]):
+    """Append a honeypot's buffered responses to its (pre-created) JSONL file."""
+    if not records:
+        return
+    
+    with open(filepath, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+    
+    print(f"   Saved {len(records)} responses to: {filepath}")
+
+async def cmd_test(pw: Playwright, browser: Browser, llm: Dict[str, Any], prompt: str,
+                   save: bool = True, honeypot_name: str = None) -> bool:
     """Test LLM with a prompt."""
     name = llm["name"]
     url = llm["url"]
@@ -202,19 +381,9 @@ async def cmd_test(llm: Dict[str, Any], prompt: str, save: bool = True, honeypot
         print(" No storage state found. Run 'setup' first.")
         return False
 
-    pw = await async_playwright().start()
-    
-    # Try headless first
+    # Try headless first, in the shared browser
+    context = await new_llm_context(browser, state_path)
     try:
-        browser = await pw.chromium.launch(headless=True)
-        context = await browser.new_context(
-            storage_state=str(state_path),
-            locale="en-US",
-            user_agent=("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                        "(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"),
-            viewport={"width": 1366, "height": 900},
-            ignore_https_errors=True,
-        )
         page = await context.new_page()
         
         print(f"Loading {url} (headless)...")
@@ -233,19 +402,11 @@ async def cmd_test(llm: Dict[str, Any], prompt: str, save: bool = True, honeypot
     
     finally:
         await context.close()
-        await browser.close()
 
     # Try headful if headless failed
+    headful = await pw.chromium.launch(headless=False, args=COMMON_ARGS)
     try:
-        browser = await pw.chromium.launch(headless=False)
-        context = await browser.new_context(
-            storage_state=str(state_path),
-            locale="en-US",
-            user_agent=("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                        "(KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"),
-            viewport={"width": 1366, "height": 900},
-            ignore_https_errors=True,
-        )
+        context = await new_llm_context(headful, state_path)
         page = await context.new_page()
         
         await page.goto(url, wait_until="domcontentloaded", timeout=120_000)
@@ -259,28 +420,71 @@ async def cmd_test(llm: Dict[str, Any], prompt: str, save: bool = True, honeypot
         return False
         
     finally:
-        await context.close()
-        await browser.close()
-        await pw.stop()
-
-async def cmd_batch(llm: Dict[str, Any], prompts_file: str, delay: int = 5) -> Dict[str, Any]:
-    """Run batch of prompts through one LLM."""
+        await headful.close()
+
+def progress_path(llm_name: str) -> Path:
+    # One file per LLM, so a run for one provider never touches another's progress
+    return RESPONSES_DIR / f"batch_progress_{sanitize_name(llm_name)}.jsonl"
+
+def flush_responses(filepath: Path, records: List[Dict[str, Any]], progress_file: Path):
+    """Save a honeypot's responses, then record those prompts as done."""
+    save_responses(filepath, records)
+    # Progress only after the responses are on disk, so a crash never marks unsaved prompts done
+    if records:
+        with open(progress_file, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps({"honeypot": r["honeypot"], "prompt": r["prompt"]},
+                                       ensure_ascii=False) + "\n"
+                            for r in records))
+
+def load_progress(path: Path) -> set:
+    """(honeypot, prompt) pairs already completed in earlier runs."""
+    if not path.exists():
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return {(e["honeypot"], e["prompt"]) for e in entries}
+
+def write_json_atomic(path: Path, data: Any):
+    """Write JSON via a temp file + rename so an interrupt never leaves it half-written."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def wait_state_path(llm_name: str) -> Path:
+    return Path(f"profiles/{sanitize_name(llm_name)}") / "wait_state.json"
+
+def load_wait_ema(llm_name: str) -> Optional[int]:
+    """Response-time EMA (ms) learned in earlier runs, if any."""
+    path = wait_state_path(llm_name)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8")).get("wait_ema")
+
+def load_prompts_file(prompts_file: str) -> Any:
+    """Read a prompts file (JSON or YAML)."""
+    data = Path(prompts_file).read_bytes()
+    if prompts_file.endswith('.json'):
+        return json.loads(data)
+    return yaml.safe_load(data)
+
+async def cmd_batch(browser: Browser, llm: Dict[str, Any], prompts_file: str,
+                    delay: int = 5, workers: int = 4,
+                    cache: Optional[ResponseCache] = None, resume: bool = False) -> Dict[str, Any]:
+    """Run batch of prompts through one LLM using a pool of tabs."""
     name = llm["name"]
     url = llm["url"]
     profile_dir = Path(f"profiles/{sanitize_name(name)}").absolute()
+    state_path = profile_dir / "storage_state.json"
 
     print(f"\n{'='*72}\nBATCH TEST: {name}\n{'='*72}")
 
-    if not profile_dir.exists():
-        print(" No profile found. Run 'setup' first.")
-        return {"success": 0, "failed": 0, "total": 0}
+    if not state_path.exists():
+        print(" No storage state found. Run 'setup' first.")
+        return {"llm": name, "success": 0, "failed": 0, "total": 0}
 
-    # Load prompts (support both JSON and YAML)
-    with open(prompts_file, "r", encoding="utf-8") as f:
-        if prompts_file.endswith('.json'):
-            data = json.load(f)
-        else:
-            data = yaml.safe_load(f)
+    # Load prompts off the event loop
+    data = await asyncio.to_thread(load_prompts_file, prompts_file)
     
     # Handle different JSON structures
     if "honeypots" in data:
@@ -296,70 +500,136 @@ async def cmd_batch(llm: Dict[str, Any], prompts_file: str, delay: int = 5) -> D
                      for i, h in enumerate(data, 1)]
     else:
         print(" Unrecognized JSON format")
-        return {"success": 0, "failed": 0, "total": 0}
+        return {"llm": name, "success": 0, "failed": 0, "total": 0}
     
     print(f" Loaded {len(honeypots)} honeypots")
     total_prompts = sum(len(prompts) for _, prompts in honeypots)
     print(f" Total prompts: {total_prompts}")
     
-    # Launch browser once and keep it open
-    pw, ctx = await launch_persistent(profile_dir, headless=True)
-    page = await ctx.new_page()
+    # One job per (honeypot, prompt); workers pull from the shared queue
+    # Responses are buffered per honeypot and written once all its prompts are done
+    queue: asyncio.Queue = asyncio.Queue()
+    records: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    remaining: Dict[str, int] = defaultdict(int)
+    progress_file = progress_path(name)
+    if resume:
+        done = await asyncio.to_thread(load_progress, progress_file)
+    else:
+        progress_file.unlink(missing_ok=True)
+        done = set()
+    skipped = 0
+    for hp_idx, (hp_name, prompts) in enumerate(honeypots, 1):
+        for p_idx, prompt in enumerate(prompts, 1):
+            if (hp_name, prompt) in done:
+                skipped += 1
+                continue
+            queue.put_nowait((hp_idx, hp_name, p_idx, prompt))
+            remaining[hp_name] += 1
     
-    success_count = 0
-    failed_count = 0
+    if skipped:
+        print(f" Resuming: {skipped} prompts already done")
+    if queue.empty():
+        return {"llm": name, "success": 0, "failed": 0, "skipped": skipped, "total": total_prompts}
     
-    try:
-        print(f"Loading {url}...")
-        await page.goto(url, wait_until="domcontentloaded", timeout=120_000)
-        
-        # Process each honeypot
-        for hp_idx, (hp_name, prompts) in enumerate(honeypots, 1):
-            
-            print(f"\n{'─'*72}")
-            print(f" Honeypot {hp_idx}/{len(honeypots)}: {hp_name} ({len(prompts)} prompts)")
-            print(f"{'─'*72}")
+    # Output paths are resolved and created once per run, not per response;
+    # each run gets its own files so reruns never append to an earlier run's
+    safe_name = sanitize_name(name)
+    run_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+    hp_files: Dict[str, Path] = {}
+    for hp_name in remaining:
+        hp_dir = RESPONSES_DIR / sanitize_name(hp_name)
+        hp_dir.mkdir(parents=True, exist_ok=True)
+        hp_files[hp_name] = hp_dir / f"{safe_name}_{run_ts}.jsonl"
+    
+    workers = max(1, min(workers, queue.qsize()))
+    limiter = RateLimiter(delay)
+    counts = {"success": 0, "failed": 0}
+    
+    async def worker(page: Page):
+        while not queue.empty():
+            hp_idx, hp_name, p_idx, prompt = queue.get_nowait()
+            print(f"\n[{hp_idx}.{p_idx}] Sending prompt ({hp_name})...")
+            print(f"  {prompt[:80]}{'...' if len(prompt) > 80 else ''}")
             
-            for p_idx, prompt in enumerate(prompts, 1):
-                print(f"\n[{hp_idx}.{p_idx}] Sending prompt...")
-                print(f"  {prompt[:80]}{'...' if len(prompt) > 80 else ''}")
-                
+            # Cache hits never reach the provider, so they skip the rate limit
+            response = cache.get(name, prompt) if cache is not None else None
+            cached = response is not None
+            if cached:
+                print(f" Cached response ({len(response)} chars)")
+            else:
+                await limiter.wait()
                 response = await send_prompt(page, llm, prompt)
-                
-                if response:
-                    save_response(name, prompt, response, hp_name)
-                    success_count += 1
-                else:
-                    failed_count += 1
-                
-                # Delay between prompts
-                if p_idx < len(prompts):
-                    print(f"  Waiting {delay}s before next prompt...")
-                    await page.wait_for_timeout(delay * 1000)
+                if response and cache is not None:
+                    cache.set(name, prompt, response)
             
-            # Longer delay between honeypots
-            if hp_idx < len(honeypots):
-                print(f"\n  Waiting {delay * 2}s before next honeypot...")
-                await page.wait_for_timeout(delay * 2000)
+            if response:
+                records[hp_name].append({
+                    "provider": name,
+                    "timestamp": datetime.now().isoformat(),
+                    "honeypot": hp_name,
+                    "prompt": prompt,
+                    "response": response,
+                    "cached": cached,
+                })
+                counts["success"] += 1
+            else:
+                counts["failed"] += 1
+            
+            remaining[hp_name] -= 1
+            if remaining[hp_name] == 0:
+                await asyncio.to_thread(flush_responses, hp_files[hp_name],
+                                        records.pop(hp_name, []), progress_file)
+    
+    # One context per LLM in the shared browser; worker tabs live in it
+    ctx = await new_llm_context(browser, state_path)
+    pages: List[Page] = []
+    tasks: List[asyncio.Task] = []
+    
+    try:
+        print(f"Loading {url} in {workers} tab(s)...")
+        for _ in range(workers):
+            page = await ctx.new_page()
+            pages.append(page)
+        loaded = await asyncio.gather(*[
+            page.goto(url, wait_until="domcontentloaded", timeout=120_000)
+            for page in pages
+        ], return_exceptions=True)
+        
+        # Carry on with the tabs that loaded rather than dropping the whole LLM
+        ready = [page for page, res in zip(pages, loaded) if not isinstance(res, Exception)]
+        if not ready:
+            raise loaded[0]
+        if len(ready) < len(pages):
+            print(f" {len(pages) - len(ready)} tab(s) failed to load, continuing with {len(ready)}")
+        
+        tasks = [asyncio.create_task(worker(page)) for page in ready]
+        await asyncio.gather(*tasks)
         
         print(f"\n{'='*72}")
         print(f" Batch complete for {name}")
-        print(f"   Success: {success_count}/{total_prompts}")
-        print(f"   Failed: {failed_count}/{total_prompts}")
+        print(f"   Success: {counts['success']}/{total_prompts}")
+        print(f"   Failed: {counts['failed']}/{total_prompts}")
         print(f"{'='*72}")
         
     except Exception as e:
         print(f" Batch failed: {e}")
     
     finally:
-        await page.wait_for_timeout(2000)
+        # Stop the other workers before their context is closed under them
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Keep whatever finished before an interruption
+        for hp_name, recs in records.items():
+            flush_responses(hp_files[hp_name], recs, progress_file)
+        await asyncio.sleep(2)
         await ctx.close()
-        await pw.stop()
     
     return {
         "llm": name,
-        "success": success_count,
-        "failed": failed_count,
+        "success": counts["success"],
+        "failed": counts["failed"],
+        "skipped": skipped,
         "total": total_prompts
     }
 
@@ -374,8 +644,11 @@ async def main():
     parser.add_argument("--name", help="Run for specific provider")
     parser.add_argument("--prompt", default="Hello, this is a test.")
     parser.add_argument("--prompts", default="prompts.json", help="JSON or YAML file with honeypots and prompts")
-    parser.add_argument("--delay", type=int, default=5, help="Delay between prompts in seconds")
+    parser.add_argument("--delay", type=int, default=5, help="Minimum seconds between prompts (across all tabs)")
+    parser.add_argument("--workers", type=int, default=4, help="Number of parallel tabs per LLM in batch mode")
     parser.add_argument("--no-save", action="store_true", help="Don't save responses")
+    parser.add_argument("--cache", action="store_true", help="Reuse cached responses in batch mode (recorded as cached)")
+    parser.add_argument("--resume", action="store_true", help="Skip batch prompts completed in a previous run")
     args = parser.parse_args()
 
     with open(args.config, "r") as f:
@@ -399,52 +672,83 @@ async def main():
         with open(args.config, "w") as f:
             yaml.safe_dump(cfg, f, sort_keys=False)
         print("\n✓ Config updated")
+        return
 
-    elif args.command in ("test", "test-all"):
-        results = {}
-        for llm in llms:
-            ok = await cmd_test(llm, args.prompt, save=not args.no_save)
-            results[llm["name"]] = ok
+    # test/batch share one browser process; each LLM gets its own context
+    pw = await async_playwright().start()
+    # Images are only dropped here; the headful fallback stays fully rendered
+    browser = await pw.chromium.launch(headless=True,
+                                       args=COMMON_ARGS + ["--blink-settings=imagesEnabled=false"])
+    # Opt-in, and batch only: test runs must always reach the provider
+    cache = ResponseCache(CACHE_PATH) if args.cache and args.command in ("batch", "batch-all") else None
+    
+    # Learned response times live next to each profile, not in config.yaml
+    initial_ema = {}
+    for llm in llms:
+        ema = load_wait_ema(llm["name"])
+        if ema is not None:
+            llm["wait_ema"] = ema
+        initial_ema[llm["name"]] = llm.get("wait_ema")
 
-        print(f"\n{'='*72}\nSUMMARY\n{'='*72}")
-        working = [k for k, v in results.items() if v]
-        failed = [k for k, v in results.items() if not v]
-        
-        print(f" Working: {len(working)}/{len(results)}")
-        for k in working:
-            print(f"  • {k}")
+    try:
+        if args.command in ("test", "test-all"):
+            results = {}
+            for llm in llms:
+                ok = await cmd_test(pw, browser, llm, args.prompt, save=not args.no_save)
+                results[llm["name"]] = ok
+
+            print(f"\n{'='*72}\nSUMMARY\n{'='*72}")
+            working = [k for k, v in results.items() if v]
+            failed = [k for k, v in results.items() if not v]
         
-        if failed:
-            print(f"\n Failed: {len(failed)}/{len(results)}")
-            for k in failed:
+            print(f" Working: {len(working)}/{len(results)}")
+            for k in working:
                 print(f"  • {k}")
+        
+            if failed:
+                print(f"\n Failed: {len(failed)}/{len(results)}")
+                for k in failed:
+                    print(f"  • {k}")
     
-    elif args.command in ("batch", "batch-all"):
-        if not Path(args.prompts).exists():
-            print(f" Prompts file not found: {args.prompts}")
-            return
+        elif args.command in ("batch", "batch-all"):
+            if not Path(args.prompts).exists():
+                print(f" Prompts file not found: {args.prompts}")
+                return
         
-        all_results = []
+            all_results = []
         
-        for llm in llms:
-            result = await cmd_batch(llm, args.prompts, args.delay)
-            all_results.append(result)
+            for llm in llms:
+                result = await cmd_batch(browser, llm, args.prompts, args.delay, args.workers,
+                                         cache, resume=args.resume)
+                all_results.append(result)
         
-        # Summary
-        print(f"\n{'='*72}")
-        print("BATCH SUMMARY")
-        print(f"{'='*72}")
+            # Summary
+            print(f"\n{'='*72}")
+            print("BATCH SUMMARY")
+            print(f"{'='*72}")
         
-        for res in all_results:
-            print(f"\n{res['llm']}:")
-            print(f"  Success: {res['success']}/{res['total']}")
-            print(f"   Failed: {res['failed']}/{res['total']}")
+            for res in all_results:
+                print(f"\n{res['llm']}:")
+                print(f"  Success: {res['success']}/{res['total']}")
+                print(f"   Failed: {res['failed']}/{res['total']}")
+                if res.get("skipped"):
+                    print(f"  Skipped: {res['skipped']}/{res['total']} (done earlier)")
         
-        # Save summary
-        summary_file = Path("responses") / f"batch_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(summary_file, "w") as f:
-            json.dump(all_results, f, indent=2)
-        print(f"\n Summary saved to: {summary_file}")
+            # Save summary
+            summary_file = RESPONSES_DIR / f"batch_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            await asyncio.to_thread(write_json_atomic, summary_file, all_results)
+            print(f"\n Summary saved to: {summary_file}")
+
+        # Persist learned response times so the next run starts adapted
+        for llm in llms:
+            if llm.get("wait_ema") != initial_ema[llm["name"]]:
+                write_json_atomic(wait_state_path(llm["name"]), {"wait_ema": llm["wait_ema"]})
+
+    finally:
+        if cache is not None:
+            cache.close()
+        await browser.close()
+        await pw.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run_event_loop(main())
\ No newline at end of file
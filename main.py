@@ -5,6 +5,7 @@ from datetime import datetime
 from pathlib import Path
 from api_handler import APIHandler
 from playwright_handler import PlaywrightHandler
+from llm_runner import run_event_loop
 
 async def save_results(persona, model, results):
     """Save results to JSON file"""
@@ -22,10 +23,10 @@ async def run_persona(persona_name, prompts, config, api_handler, playwright_han
     print(f"PERSONA: {persona_name}")
     print(f"{'='*70}")
     
-    # API LLMs (5 models)
+    # API LLMs (5 models) - independent providers, so query them concurrently
     api_models = ['openai', 'anthropic', 'gemini', 'perplexity', 'mistral']
     
-    for model in api_models:
+    async def run_api_model(model):
         print(f"\n[API] Running {model.upper()}...")
         try:
             results = await api_handler.run_batch(
@@ -38,10 +39,8 @@ async def run_persona(persona_name, prompts, config, api_handler, playwright_han
             print(f"  ✓ Completed {model}")
         except Exception as e:
             print(f"  ✗ Error with {model}: {e}")
-        
-        # Wait between LLMs
-        print(f"   Waiting {config['timing']['between_llms']}s...")
-        await asyncio.sleep(config['timing']['between_llms'])
+    
+    await asyncio.gather(*[run_api_model(model) for model in api_models])
     
     # Playwright LLMs (8 models)
     for llm_config in config['playwright_llms']:
@@ -132,6 +131,6 @@ async def main():
 
 if __name__ == '__main__':
     try:
-        asyncio.run(main())
+        run_event_loop(main())
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
\ No newline at end of file
@@ -1,48 +1,139 @@
 import asyncio
+import os
+import re
+import shutil
+import tempfile
+from collections import deque
+from urllib.parse import urlparse
 from playwright.async_api import async_playwright
+from llm_runner import BLOCKED_RESOURCES, block_heavy_resources
 import json
 import yaml
 
-async def test_selectors(page, llm_config):
-    """Test if selectors work on the current page"""
-    print(f"\n  Testing selectors...")
-    
-    results = {
-        'input': False,
-        'submit': False,
-        'response': False
-    }
-    
-    # Test input selector
-    try:
-        input_elem = await page.wait_for_selector(llm_config['input_selector'], timeout=3000)
-        if input_elem:
-            results['input'] = True
-            print(f"  ✓ Input selector works: {llm_config['input_selector']}")
-    except:
-        print(f"  ✗ Input selector FAILED: {llm_config['input_selector']}")
-    
-    # Test submit selector
+# libyaml-backed loader/dumper when available, pure-Python otherwise
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# Common selectors tried by find_selector_interactive, per selector type
+COMMON_INPUT_SELECTORS = (
+    'textarea',
+    'input[type="text"]',
+    'div[contenteditable="true"]',
+    '[placeholder*="Ask"]',
+    '[placeholder*="ask"]',
+    '[aria-label*="message"]',
+    '[aria-label*="Message"]',
+    '.input-box',
+    '#prompt-textarea',
+    '.ql-editor',
+)
+
+COMMON_SUBMIT_SELECTORS = (
+    'button[type="submit"]',
+    'button[aria-label*="Send"]',
+    'button[aria-label*="Submit"]',
+    'button:has-text("Send")',
+    '[data-testid="send-button"]',
+    '.send-button',
+    '[aria-label*="send"]',
+)
+
+COMMON_RESPONSE_SELECTORS = (
+    '.markdown',
+    '.message',
+    '.response',
+    '.answer',
+    '[class*="message"]',
+    '[class*="response"]',
+    '[class*="answer"]',
+    '.prose',
+    'article',
+)
+
+COMMON_SELECTORS = {
+    'input': COMMON_INPUT_SELECTORS,
+    'submit': COMMON_SUBMIT_SELECTORS,
+    'response': COMMON_RESPONSE_SELECTORS,
+}
+
+# True if the selector matches a rendered element (hidden widgets like
+# reCAPTCHA's textarea don't count), null if it isn't plain CSS
+VISIBLE_MATCH_JS = """
+sel => {
+    try { return [...document.querySelectorAll(sel)].some(el => el.getClientRects().length > 0); }
+    catch (e) { return null; }
+}
+""".strip()
+
+# Resolves true as soon as the selector matches a rendered element (checked on
+# every DOM mutation), false after the timeout, null if it isn't plain CSS
+FAST_WAIT_JS = """
+({sel, timeout}) => new Promise(resolve => {
+    const found = () => (%s)(sel);
+    const now = found();
+    if (now !== false) return resolve(now);
+    const obs = new MutationObserver(() => {
+        if (found()) { obs.disconnect(); resolve(true); }
+    });
+    obs.observe(document, {childList: true, subtree: true, attributes: true});
+    setTimeout(() => { obs.disconnect(); resolve(false); }, timeout);
+})
+""" % VISIBLE_MATCH_JS
+
+async def _fast_wait(page, sel, timeout):
+    """Wait up to `timeout` ms for `sel`, push-based instead of polling"""
     try:
-        submit_elem = await page.wait_for_selector(llm_config['submit_selector'], timeout=3000)
-        if submit_elem:
-            results['submit'] = True
-            print(f"  ✓ Submit selector works: {llm_config['submit_selector']}")
+        ok = await page.evaluate(FAST_WAIT_JS, {'sel': sel, 'timeout': timeout})
+        if ok is None:
+            # Playwright-only syntax (e.g. :has-text), so let Playwright resolve it
+            await page.wait_for_selector(sel, state='visible', timeout=timeout)
+            return True
+        return ok
     except:
-        print(f"  ✗ Submit selector FAILED: {llm_config['submit_selector']}")
+        return False
+
+SELECTOR_KEYS = {
+    'input': 'input_selector',
+    'submit': 'submit_selector',
+    'response': 'response_selector'
+}
+
+async def _probe(page, kind, selector):
+    """Check one selector and report the result"""
+    # The user has confirmed the page is loaded: present selectors resolve at
+    # once, late-rendered ones on the next DOM mutation, and a wrong selector
+    # only costs a short grace period instead of a full polling timeout
+    if kind == 'response':
+        # Response selector might not exist yet, that's OK
+        try:
+            ok = bool(await page.query_selector(selector))
+        except:
+            ok = False
+    else:
+        ok = await _fast_wait(page, selector, 1000)
     
-    # Test response selector (might not exist yet, that's OK)
-    try:
-        response_elem = await page.query_selector(llm_config['response_selector'])
-        if response_elem:
-            results['response'] = True
-            print(f"  ✓ Response selector works: {llm_config['response_selector']}")
-        else:
-            print(f"  ⚠  Response selector not found (might appear after first query): {llm_config['response_selector']}")
-    except:
-        print(f"  ⚠  Response selector not found (might appear after first query): {llm_config['response_selector']}")
+    if ok:
+        print(f"  ✓ {kind.capitalize()} selector works: {selector}")
+    elif kind == 'response':
+        print(f"  ⚠  Response selector not found (might appear after first query): {selector}")
+    else:
+        print(f"  ✗ {kind.capitalize()} selector FAILED: {selector}")
+    return ok
+
+async def test_selectors(page, llm_config, kinds=tuple(SELECTOR_KEYS)):
+    """Test if selectors work on the current page"""
+    print(f"\n  Testing selectors...")
     
-    return results
+    # The probes are independent reads, so run them concurrently
+    oks = await asyncio.gather(*[_probe(page, k, llm_config[SELECTOR_KEYS[k]]) for k in kinds])
+    return dict(zip(kinds, oks))
+
+async def retest_subset(page, llm_config, previous):
+    """Re-test only the selectors that failed before; passing ones are kept as-is"""
+    failed = [k for k, ok in previous.items() if not ok]
+    return {**previous, **await test_selectors(page, llm_config, failed)}
 
 async def find_selector_interactive(page, selector_type):
     """Help user find the correct selector interactively"""
@@ -55,51 +146,18 @@ async def find_selector_interactive(page, selector_type):
     
     if choice == '2':
         # Try common selectors based on type
-        if selector_type == 'input':
-            common = [
-                'textarea',
-                'input[type="text"]',
-                'div[contenteditable="true"]',
-                '[placeholder*="Ask"]',
-                '[placeholder*="ask"]',
-                '[aria-label*="message"]',
-                '[aria-label*="Message"]',
-                '.input-box',
-                '#prompt-textarea',
-                '.ql-editor'
-            ]
-        elif selector_type == 'submit':
-            common = [
-                'button[type="submit"]',
-                'button[aria-label*="Send"]',
-                'button[aria-label*="Submit"]',
-                'button:has-text("Send")',
-                '[data-testid="send-button"]',
-                '.send-button',
-                '[aria-label*="send"]'
-            ]
-        else:  # response
-            common = [
-                '.markdown',
-                '.message',
-                '.response',
-                '.answer',
-                '[class*="message"]',
-                '[class*="response"]',
-                '[class*="answer"]',
-                '.prose',
-                'article'
-            ]
+        common = COMMON_SELECTORS.get(selector_type, COMMON_RESPONSE_SELECTORS)
         
         print(f"\n  Trying common selectors...")
-        for selector in common:
-            try:
-                elem = await page.wait_for_selector(selector, timeout=1000)
-                if elem:
-                    print(f"  ✅ Found: {selector}")
-                    return selector
-            except:
-                pass
+        # Check every candidate in one in-page pass instead of one round-trip each
+        hits = await page.evaluate(f"sels => sels.map(s => ({VISIBLE_MATCH_JS})(s))", list(common))
+        for selector, hit in zip(common, hits):
+            if hit is None:
+                # Not plain CSS (e.g. :has-text): _fast_wait hands it to Playwright
+                hit = await _fast_wait(page, selector, 500)
+            if hit:
+                print(f"  ✅ Found: {selector}")
+                return selector
         
         print(f"  ❌ None of the common selectors worked")
     
@@ -108,27 +166,62 @@ async def find_selector_interactive(page, selector_type):
     
     return manual_selector if manual_selector else None
 
-async def save_cookies_for_llm(llm_name, llm_config):
+# Trackers the login flow never needs, blocked on top of llm_runner's shared
+# media/font list. Images stay enabled so image captchas and login buttons
+# still render for the user.
+BLOCKED_DOMAINS = re.compile(
+    r'^https?://([^/]*\.)?(google-analytics\.com|googletagmanager\.com'
+    r'|doubleclick\.net|segment\.io|hotjar\.com)[:/]'
+)
+
+def _matches_host(domain, hosts):
+    domain = domain.lstrip('.')
+    return any(h == domain or h.endswith('.' + domain) for h in hosts if h)
+
+def first_party_state(state, hosts):
+    """Keep only the cookies and localStorage origins that belong to `hosts`"""
+    state['cookies'] = [c for c in state['cookies'] if _matches_host(c['domain'], hosts)]
+    state['origins'] = [o for o in state.get('origins', [])
+                        if _matches_host(urlparse(o['origin']).hostname or '', hosts)]
+    return state
+
+def cookie_file_for(llm_name):
+    return f'cookies_{llm_name}.json'
+
+async def open_and_goto(browser, llm_config, storage_state=None):
+    """Open a fresh context for an LLM and load its page (safe to run concurrently)"""
+    # Each LLM gets its own context in the shared browser
+    context = await browser.new_context(storage_state=storage_state)
+    await context.route(BLOCKED_RESOURCES, block_heavy_resources)
+    await context.route(BLOCKED_DOMAINS, block_heavy_resources)
+    page = await context.new_page()
+    
+    # Keep recent console output for debugging; it is only printed when a
+    # selector test fails, since chat UIs log thousands of lines on load
+    console_log = deque(maxlen=200)
+    page.on('console', lambda msg: console_log.append(msg.text))
+    
+    print(f"Opening {llm_config['url']}...")
+    # Chat sites keep long-polling connections open, so 'networkidle' rarely
+    # fires; the login prompt afterwards is the real synchronization point
+    try:
+        await page.goto(llm_config['url'], wait_until='domcontentloaded', timeout=15000)
+    except:
+        print(f"  ⚠️  Timeout/error loading {llm_config['url']}, but continuing...")
+    
+    return context, page, console_log
+
+async def save_cookies_for_llm(context, page, console_log, llm_name, llm_config, logged_in=False):
     """Manually login and save cookies for a specific LLM, with selector testing"""
     print(f"\n{'='*70}")
     print(f"Setting up: {llm_name.upper()}")
     print(f"{'='*70}")
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)  # Show browser
-        context = await browser.new_context()
-        page = await context.new_page()
-        
-        # Enable console logging for debugging
-        page.on('console', lambda msg: print(f"  [Browser Console] {msg.text}"))
-        
-        print(f"Opening {llm_config['url']}...")
-        try:
-            await page.goto(llm_config['url'], wait_until='networkidle', timeout=60000)
-        except:
-            print(f"  ⚠️  Timeout/error loading page, but continuing...")
-            await page.wait_for_timeout(3000)
-        
+    if logged_in:
+        print(f"\n✓ Reusing the login of an earlier service on the same site")
+        # No ENTER to sync on here, so let the chat UI render before testing it
+        await _fast_wait(page, llm_config['input_selector'], 15000)
+    else:
         print(f"\n📱 INSTRUCTIONS FOR {llm_name.upper()}")
         print("=" * 70)
         print("1. Complete the login process in the browser (if needed)")
@@ -138,64 +231,84 @@ async def save_cookies_for_llm(llm_name, llm_config):
         print("=" * 70)
         
         input()  # Wait for user to login
+    
+    # Test selectors
+    print(f"\n{'='*70}")
+    print(f"TESTING SELECTORS FOR {llm_name.upper()}")
+    print(f"{'='*70}")
+    
+    test_results = await test_selectors(page, llm_config)
+    
+    # If any selector failed, offer to find new ones
+    if not all(test_results.values()):
+        print(f"\n  Recent browser console output:")
+        for line in console_log:
+            print(f"  [Browser Console] {line}")
+        print(f"\n⚠️  Some selectors don't work!")
+        print(f"Would you like to find correct selectors? (y/n)")
+        fix = input().strip().lower()
         
-        # Test selectors
-        print(f"\n{'='*70}")
-        print(f"TESTING SELECTORS FOR {llm_name.upper()}")
-        print(f"{'='*70}")
-        
-        test_results = await test_selectors(page, llm_config)
-        
-        # If any selector failed, offer to find new ones
-        if not all(test_results.values()):
-            print(f"\n⚠️  Some selectors don't work!")
-            print(f"Would you like to find correct selectors? (y/n)")
-            fix = input().strip().lower()
+        if fix == 'y':
+            new_config = llm_config.copy()
             
-            if fix == 'y':
-                new_config = llm_config.copy()
-                
-                if not test_results['input']:
-                    print(f"\n🔍 Finding INPUT selector...")
-                    print(f"Current: {llm_config['input_selector']}")
-                    new_selector = await find_selector_interactive(page, 'input')
-                    if new_selector:
-                        new_config['input_selector'] = new_selector
-                
-                if not test_results['submit']:
-                    print(f"\n🔍 Finding SUBMIT button selector...")
-                    print(f"Current: {llm_config['submit_selector']}")
-                    new_selector = await find_selector_interactive(page, 'submit')
-                    if new_selector:
-                        new_config['submit_selector'] = new_selector
-                
-                if not test_results['response']:
-                    print(f"\n🔍 Finding RESPONSE selector...")
-                    print(f"Current: {llm_config['response_selector']}")
-                    new_selector = await find_selector_interactive(page, 'response')
-                    if new_selector:
-                        new_config['response_selector'] = new_selector
-                
-                # Test new selectors
-                print(f"\n  Testing new selectors...")
-                new_results = await test_selectors(page, new_config)
-                
-                if sum(new_results.values()) > sum(test_results.values()):
-                    print(f"\n  ✅ New selectors are better!")
-                    llm_config.update(new_config)
-                else:
-                    print(f"\n  ⚠️  New selectors didn't improve things")
-        else:
-            print(f"\n✅ All selectors work!")
-        
-        # Save cookies
-        cookie_file = f'cookies_{llm_name}.json'
-        await context.storage_state(path=cookie_file)
-        print(f"\n✓ Cookies saved to {cookie_file}")
-        
-        await browser.close()
-        
-        return llm_config
+            if not test_results['input']:
+                print(f"\n🔍 Finding INPUT selector...")
+                print(f"Current: {llm_config['input_selector']}")
+                new_selector = await find_selector_interactive(page, 'input')
+                if new_selector:
+                    new_config['input_selector'] = new_selector
+            
+            if not test_results['submit']:
+                print(f"\n🔍 Finding SUBMIT button selector...")
+                print(f"Current: {llm_config['submit_selector']}")
+                new_selector = await find_selector_interactive(page, 'submit')
+                if new_selector:
+                    new_config['submit_selector'] = new_selector
+            
+            if not test_results['response']:
+                print(f"\n🔍 Finding RESPONSE selector...")
+                print(f"Current: {llm_config['response_selector']}")
+                new_selector = await find_selector_interactive(page, 'response')
+                if new_selector:
+                    new_config['response_selector'] = new_selector
+            
+            # Test new selectors (the ones that passed haven't changed)
+            print(f"\n  Testing new selectors...")
+            new_results = await retest_subset(page, new_config, test_results)
+            
+            if sum(new_results.values()) > sum(test_results.values()):
+                print(f"\n  ✅ New selectors are better!")
+                # Return a new dict so main() can still diff against the original
+                llm_config = new_config
+            else:
+                print(f"\n  ⚠️  New selectors didn't improve things")
+    else:
+        print(f"\n✅ All selectors work!")
+    
+    # Save cookies
+    cookie_file = cookie_file_for(llm_name)
+    state = first_party_state(await context.storage_state(),
+                              {urlparse(llm_config['url']).hostname, urlparse(page.url).hostname})
+    with open(cookie_file, 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    print(f"\n✓ Cookies saved to {cookie_file}")
+    
+    await context.close()
+    
+    return llm_config
+
+def save_config_atomic(config, path):
+    """Write config to a temp file next to `path`, then rename it over `path`"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yaml.dump(config, f, Dumper=SafeDumper, default_flow_style=False, sort_keys=False)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
 
 async def main():
     print("="*70)
@@ -210,7 +323,7 @@ async def main():
     
     # Load current config
     with open('config.yaml', 'r') as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=SafeLoader)
     
     llms = config['playwright_llms']
     
@@ -226,16 +339,40 @@ async def main():
     
     updated_configs = []
     
-    for llm in llms:
-        updated_config = await save_cookies_for_llm(llm['name'], llm)
-        updated_configs.append(updated_config)
+    # Launch the browser once; every LLM gets a fresh context in it
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=False)  # Show browser
+        try:
+            # Services on an already-seen origin reuse that origin's saved cookies
+            origins = [urlparse(llm['url']).netloc for llm in llms]
+            first_of_origin = []
+            seen = set()
+            for i, origin in enumerate(origins):
+                if origin not in seen:
+                    seen.add(origin)
+                    first_of_origin.append(i)
+            
+            # Load the first page per origin concurrently, then log in one service at a time
+            opened = dict(zip(first_of_origin, await asyncio.gather(
+                *[open_and_goto(browser, llms[i]) for i in first_of_origin])))
+            origin_to_cookie_file = {}
+            for i, llm in enumerate(llms):
+                origin = origins[i]
+                if i in opened:
+                    context, page, console_log = opened[i]
+                else:
+                    context, page, console_log = await open_and_goto(
+                        browser, llm, origin_to_cookie_file[origin])
+                updated_config = await save_cookies_for_llm(context, page, console_log, llm['name'], llm,
+                                                            logged_in=i not in opened)
+                updated_configs.append(updated_config)
+                origin_to_cookie_file[origin] = cookie_file_for(llm['name'])
+        finally:
+            await browser.close()
     
-    # Check if any selectors were updated
-    config_changed = False
-    for i, llm in enumerate(llms):
-        if llm != updated_configs[i]:
-            config_changed = True
-            break
+    # Check if any selectors were updated (positional, so duplicate configs can't alias)
+    changed = [llm for i, llm in enumerate(updated_configs) if llm != llms[i]]
+    config_changed = bool(changed)
     
     if config_changed:
         print("\n" + "="*70)
@@ -246,18 +383,16 @@ async def main():
         
         if save == 'y':
             config['playwright_llms'] = updated_configs
-            with open('config.yaml', 'w') as f:
-                yaml.dump(config, f, default_flow_style=False, sort_keys=False)
+            save_config_atomic(config, 'config.yaml')
             print("✓ config.yaml updated with new selectors!")
         else:
             print("⚠️  Selectors NOT saved. You can manually update config.yaml")
             print("\nUpdated selectors:")
-            for llm in updated_configs:
-                if llm != llms[updated_configs.index(llm)]:
-                    print(f"\n{llm['name']}:")
-                    print(f"  input_selector: {llm['input_selector']}")
-                    print(f"  submit_selector: {llm['submit_selector']}")
-                    print(f"  response_selector: {llm['response_selector']}")
+            for llm in changed:
+                print(f"\n{llm['name']}:")
+                print(f"  input_selector: {llm['input_selector']}")
+                print(f"  submit_selector: {llm['submit_selector']}")
+                print(f"  response_selector: {llm['response_selector']}")
     
     print("\n" + "="*70)
     print("✓ ALL SETUP COMPLETE!")